@@ -0,0 +1,160 @@
+import os
+import json
+import hashlib
+from functools import lru_cache
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+
+def flag_svg_path(code, config, max_depth=8):
+    """Возвращает путь к SVG флага по его коду (например, "ua" или "gb-sct").
+
+    Часть файлов в assets/flags — симлинки, сохранённые как текст с именем
+    целевого файла (например, uk.svg -> gb.svg); такие ссылки разрешаются.
+    """
+    path = os.path.join(config["flag_dir"], f"{code}.svg")
+    for _ in range(max_depth):
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"Флаг '{code}' не найден: {path}")
+        with open(path, "rb") as file:
+            content = file.read().strip()
+        if content.startswith(b"<"):
+            return path
+        path = os.path.join(config["flag_dir"], content.decode("utf-8"))
+    raise FileNotFoundError(f"Флаг '{code}': слишком длинная цепочка ссылок")
+
+
+def flag_cache_key(svg_path, size):
+    """Ключ кэша: хэш содержимого SVG и целевой размер."""
+    with open(svg_path, "rb") as file:
+        svg_hash = hashlib.sha1(file.read()).hexdigest()[:16]
+    return f"{svg_hash}_{size}"
+
+
+def rasterize_flag(svg_path, size):
+    """Растеризует SVG так, чтобы флаг вписался в квадрат size x size."""
+    import cairosvg  # Нужен только при холодном кэше
+
+    png_data = cairosvg.svg2png(url=svg_path, output_height=size)
+    image = Image.open(BytesIO(png_data)).convert("RGBA")
+    if image.width > size:
+        image = image.resize(
+            (size, max(1, round(image.height * size / image.width))),
+            Image.LANCZOS,
+        )
+    return np.asarray(image)
+
+
+def evict_flag_cache(cache_dir, max_entries):
+    """Удаляет давно не использованные флаги и атласы, оставляя не более max_entries."""
+    entries = [
+        os.path.join(cache_dir, name)
+        for name in os.listdir(cache_dir)
+        if name.endswith(".npy")
+    ]
+    if len(entries) <= max_entries:
+        return
+    entries.sort(key=os.path.getmtime)
+    for path in entries[: len(entries) - max_entries]:
+        os.remove(path)
+        # У атласа рядом лежит JSON с координатами флагов
+        boxes_path = path[: -len(".npy")] + ".json"
+        if os.path.exists(boxes_path):
+            os.remove(boxes_path)
+
+
+@lru_cache(maxsize=256)
+def _load_flag_array(key, svg_path, size, cache_dir, max_entries):
+    """Загружает растр флага с диска или растеризует его и кладёт в кэш."""
+    cache_path = os.path.join(cache_dir, f"{key}.npy")
+    if os.path.exists(cache_path):
+        os.utime(cache_path)  # Обновляем время доступа для LRU
+        return np.load(cache_path)
+
+    array = rasterize_flag(svg_path, size)
+    os.makedirs(cache_dir, exist_ok=True)
+    np.save(cache_path, array)
+    evict_flag_cache(cache_dir, max_entries)
+    return array
+
+
+def load_flag(code, config):
+    """Возвращает флаг как RGBA-изображение размера config["flag_size"]."""
+    svg_path = flag_svg_path(code, config)
+    key = flag_cache_key(svg_path, config["flag_size"])
+    array = _load_flag_array(
+        key,
+        svg_path,
+        config["flag_size"],
+        config["flag_cache_dir"],
+        config["flag_cache_max_entries"],
+    )
+    return Image.fromarray(array)
+
+
+def build_flag_atlas(codes, config):
+    """Упаковывает флаги в один атлас и сохраняет его рядом с кэшем флагов."""
+    size = config["flag_size"]
+    codes = sorted(set(codes))
+    images = {code: load_flag(code, config) for code in codes}
+
+    columns = max(1, int(np.ceil(np.sqrt(len(codes)))))
+    rows = max(1, int(np.ceil(len(codes) / columns)))
+    atlas = np.zeros((rows * size, columns * size, 4), dtype=np.uint8)
+    boxes = {}
+    for index, code in enumerate(codes):
+        x = (index % columns) * size
+        y = (index // columns) * size
+        width, height = images[code].size
+        atlas[y : y + height, x : x + width] = np.asarray(images[code])
+        boxes[code] = [x, y, width, height]
+
+    atlas_key = _flag_atlas_key(codes, config)
+    os.makedirs(config["flag_cache_dir"], exist_ok=True)
+    np.save(os.path.join(config["flag_cache_dir"], f"atlas_{atlas_key}.npy"), atlas)
+    with open(
+        os.path.join(config["flag_cache_dir"], f"atlas_{atlas_key}.json"), "w"
+    ) as file:
+        json.dump(boxes, file)
+    evict_flag_cache(config["flag_cache_dir"], config["flag_cache_max_entries"])
+    return atlas, boxes
+
+
+def load_flags(codes, config):
+    """Возвращает словарь код -> изображение флага для всех флагов викторины.
+
+    Если включён config["flag_atlas"], все флаги читаются одним файлом атласа.
+    """
+    codes = sorted(set(codes))
+    if not codes:
+        return {}
+    if not config.get("flag_atlas"):
+        return {code: load_flag(code, config) for code in codes}
+
+    atlas_key = _flag_atlas_key(codes, config)
+    atlas_path = os.path.join(config["flag_cache_dir"], f"atlas_{atlas_key}.npy")
+    boxes_path = os.path.join(config["flag_cache_dir"], f"atlas_{atlas_key}.json")
+    if os.path.exists(atlas_path) and os.path.exists(boxes_path):
+        os.utime(atlas_path)  # Обновляем время доступа для LRU
+        atlas = np.load(atlas_path)
+        with open(boxes_path, "r") as file:
+            boxes = json.load(file)
+    else:
+        atlas, boxes = build_flag_atlas(codes, config)
+
+    flags = {}
+    for code in codes:
+        x, y, width, height = boxes[code]
+        flags[code] = Image.fromarray(atlas[y : y + height, x : x + width])
+    return flags
+
+
+def _flag_atlas_key(codes, config):
+    """Ключ атласа зависит от содержимого и размера всех входящих в него флагов."""
+    keys = [
+        flag_cache_key(flag_svg_path(code, config), config["flag_size"])
+        for code in codes
+    ]
+    return hashlib.sha1(",".join(keys).encode()).hexdigest()[:16]
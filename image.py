@@ -1,6 +1,7 @@
 import os
 import json
 from PIL import Image, ImageDraw, ImageFont
+from flags import load_flags
 
 # Конфигурация
 CONFIG = {
@@ -22,6 +23,11 @@ CONFIG = {
     "answer_image_dir": "./temp/images/answers",
     "data_path": "./input/data/data.json",
     "fixed_width": 1080,
+    "flag_dir": "./assets/flags",
+    "flag_cache_dir": "./temp/cache/flags",
+    "flag_size": 120,
+    "flag_cache_max_entries": 512,
+    "flag_atlas": True,
 }
 
 
@@ -59,9 +65,18 @@ def wrap_text(text, font, max_width):
 
 
 def create_image_with_text(
-    text, bg_color, text_color, save_path, config, overlay_image_path=None
+    text,
+    bg_color,
+    text_color,
+    save_path,
+    config,
+    overlay_image_path=None,
+    overlay_image=None,
 ):
-    """Создаёт изображение с текстом, дополнительно накладывая изображение сверху, если требуется."""
+    """Создаёт изображение с текстом, дополнительно накладывая изображение сверху, если требуется.
+
+    Вместо пути можно передать готовое RGBA-изображение в overlay_image, например флаг из load_flags.
+    """
     font = ImageFont.truetype(config["font_path"], config["font_size"])
     wrapped_text = wrap_text(
         text, font, config["max_width"] - 2 * config["padding_horizontal"]
@@ -82,6 +97,7 @@ def create_image_with_text(
     overlay_height = 0
     if overlay_image_path:
         overlay_image = Image.open(overlay_image_path).convert("RGBA")
+    if overlay_image is not None:
         overlay_width, overlay_height = overlay_image.size
 
     total_height = bg_height + overlay_height - 14
@@ -112,21 +128,30 @@ def create_image_with_text(
         (text_x, text_y), wrapped_text, font=font, fill=text_color, align="center"
     )
 
-    if overlay_image_path:
+    if overlay_image is not None:
         overlay_x = x_offset + (bg_width - overlay_width) // 2
         image.paste(overlay_image, (overlay_x, 32), overlay_image)
 
     image.save(save_path)
 
 
-def process_data(config):
-    """Обрабатывает данные и создаёт изображения для вопросов и ответов."""
+def process_data(config, create_answers=True):
+    """Обрабатывает данные и создаёт изображения для вопросов и ответов.
+
+    При create_answers=False создаются только карточки вопросов.
+    """
     os.makedirs(config["question_image_dir"], exist_ok=True)
-    os.makedirs(config["answer_image_dir"], exist_ok=True)
+    if create_answers:
+        os.makedirs(config["answer_image_dir"], exist_ok=True)
 
     with open(config["data_path"], "r", encoding="utf-8") as file:
         data = json.load(file)
 
+    # Флаги растеризуются один раз и дальше читаются из кэша
+    flags = load_flags(
+        [item["flag"] for item in data["questions"] if item.get("flag")], config
+    )
+
     for item in data["questions"]:
         number = item["number"]
         question_image_path = os.path.join(
@@ -139,22 +164,27 @@ def process_data(config):
             config["number_image_dir"], f"number_{number}.png"
         )
 
+        # Во флаг-викторине вместо номера над вопросом показывается флаг
+        flag_image = flags.get(item.get("flag"))
+
         create_image_with_text(
             item["question"],
             config["question_bg_color"],
             config["question_text_color"],
             question_image_path,
             config,
-            number_image_path,
-        )
-        create_image_with_text(
-            item["answer"],
-            config["answer_bg_color"],
-            config["answer_text_color"],
-            answer_image_path,
-            config,
-            config["success_image_path"],
+            number_image_path if flag_image is None else None,
+            flag_image,
         )
+        if create_answers:
+            create_image_with_text(
+                item["answer"],
+                config["answer_bg_color"],
+                config["answer_text_color"],
+                answer_image_path,
+                config,
+                config["success_image_path"],
+            )
 
 
 if __name__ == "__main__":
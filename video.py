@@ -4,19 +4,25 @@ from moviepy import (
     ImageClip,
     AudioFileClip,
 )
+from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+import os
+import hashlib
 import json
 import numpy as np
+from image import CONFIG as IMAGE_CONFIG, process_data
 
 # Загрузка данных из JSON
 with open("./temp/metadata.json", "r", encoding="utf-8") as file:
     data = json.load(file)
 
 video_duration = data["audio_duration"] / 1000  # Перевод из миллисекунд в секунды
-clips = []
 
 # Параметры экрана и анимации
 screen_width = 1080
 screen_height = 1920
+fps = 24
 move_in_duration = 0.5  # Длительность анимации появления
 move_out_duration = 0.5  # Длительность анимации исчезновения
 answer_display_duration = 1.5  # Время отображения изображения ответа
@@ -26,6 +32,29 @@ timer_position = (
     212,
 )  # Позиция таймера: центр по горизонтали, 212 пикселей от верха
 
+# Варианты рендера. Если список пуст, рендерится одно видео как раньше.
+# Все варианты рендерятся за один проход: фон, таймер, ответы и хук
+# декодируются один раз на кадр, общие нижние слои смешиваются один раз,
+# а каждый вариант в своём потоке накладывает только карточки вопросов,
+# хук и то, что лежит над ними.
+# Как и обычный рендер, режим вариантов ждёт, что image.py уже запущен:
+# карточки ответов берутся из ./temp/images/answers, а для каждого стиля
+# number_image_dir заново создаются только карточки вопросов.
+variants = [
+    # {
+    #     "name": "v1_genius_5000k",
+    #     "number_image_dir": "./assets/images/numbers/v1",
+    #     "hook": True,
+    #     "bitrate": "5000k",
+    # },
+    # {
+    #     "name": "v4_nohook_3000k",
+    #     "number_image_dir": "./assets/images/numbers/v4",
+    #     "hook": False,
+    #     "bitrate": "3000k",
+    # },
+]
+
 
 # Функция для эффекта ease-in/ease-out
 def ease_in_out(progress):
@@ -56,14 +85,9 @@ if not timer_original.mask:
     )
     timer_original = timer_original.with_opacity(0.5)
 
-for entry in data["combined_data"]:
-    number = entry["number"]
-
-    # Вопрос
-    question_start = entry["question"]["start_time"] / 1000
-    question_end = entry["question"]["end_time"] / 1000
-    question_img_path = f"./temp/images/questions/question_{number}.png"
 
+def make_question_clip(question_img_path, question_start, question_end):
+    """Создаёт клип вопроса с анимацией появления и исчезновения."""
     question_clip = ImageClip(question_img_path)
     image_width, image_height = question_clip.size
     start_pos = -image_width
@@ -101,22 +125,24 @@ for entry in data["combined_data"]:
             x = 2 * screen_width
         return (x, "center")
 
-    question_clip = (
+    return (
         question_clip.with_position(question_position_with_swing)
         .with_start(question_start)
         .with_duration(question_end - question_start)
     )
-    clips.append(question_clip)
 
-    # Ответ
-    answer_start = entry["answer"]["start_time"] / 1000
-    answer_img_path = f"./temp/images/answers/answer_{number}.png"
 
+def make_answer_clip(answer_img_path, answer_start):
+    """Создаёт клип ответа с анимацией появления и исчезновения."""
     answer_clip = (
         ImageClip(answer_img_path)
         .with_start(answer_start)
         .with_duration(answer_display_duration)
     )
+    image_width, image_height = answer_clip.size
+    start_pos = -image_width
+    center_pos = (screen_width - image_width) / 2
+    end_pos = screen_width
 
     def answer_position(t):
         if 0 <= t < move_in_duration:
@@ -136,8 +162,32 @@ for entry in data["combined_data"]:
             x = 2 * screen_width
         return (x, "center")
 
-    answer_clip = answer_clip.with_position(answer_position)
-    clips.append(answer_clip)
+    return answer_clip.with_position(answer_position)
+
+
+def make_question_clips(question_image_dir):
+    """Создаёт клипы вопросов из карточек в указанной папке."""
+    return [
+        make_question_clip(
+            f"{question_image_dir}/question_{entry['number']}.png",
+            entry["question"]["start_time"] / 1000,
+            entry["question"]["end_time"] / 1000,
+        )
+        for entry in data["combined_data"]
+    ]
+
+
+# Ответы и таймеры одинаковы для всех вариантов
+answer_clips = []
+timer_clips = []
+for entry in data["combined_data"]:
+    number = entry["number"]
+
+    # Ответ
+    answer_start = entry["answer"]["start_time"] / 1000
+    answer_clips.append(
+        make_answer_clip(f"./temp/images/answers/answer_{number}.png", answer_start)
+    )
 
     # Таймер
     timer_start_time = answer_start - timer_offset
@@ -145,11 +195,13 @@ for entry in data["combined_data"]:
         timer_clip = timer_original.with_start(timer_start_time).with_position(
             timer_position
         )
-        clips.append(timer_clip)
+        timer_clips.append(timer_clip)
     else:
         print(
             f"Warning: Timer for answer {number} starts before the beginning of the video. Skipping timer addition."
         )
+        timer_clips.append(None)
+
 monkey_clip = VideoFileClip("./assets/hooks/genius/genius.mov", has_mask=True)
 if not monkey_clip.mask:
     monkey_clip = monkey_clip.with_opacity(0.5)
@@ -157,14 +209,206 @@ if monkey_clip.duration > video_duration:
     monkey_clip = monkey_clip.subclip(0, video_duration)
 monkey_clip = monkey_clip.with_position(("center", "center")).with_start(0)
 
-# Сбор всех клипов
-all_clips = [background] + clips + [monkey_clip]
 
-final_video = CompositeVideoClip(
-    all_clips, size=(screen_width, screen_height)
-).with_duration(video_duration)
+def layer_slots(hook=True):
+    """Порядок слоёв итогового видео: фон, затем вопрос, ответ и таймер каждого пункта, сверху хук.
+
+    Слот вопроса хранит номер пункта, потому что карточки вопросов зависят от варианта.
+    """
+    slots = [background]
+    for index, (answer_clip, timer_clip) in enumerate(zip(answer_clips, timer_clips)):
+        slots.append(index)
+        slots.append(answer_clip)
+        if timer_clip is not None:
+            slots.append(timer_clip)
+    if hook:
+        slots.append(monkey_clip)
+    return slots
+
+
+def compose_video(question_clips, hook=True):
+    """Собирает итоговое видео из общих слоёв и клипов вопросов варианта."""
+    all_clips = [
+        question_clips[slot] if isinstance(slot, int) else slot
+        for slot in layer_slots(hook)
+    ]
+
+    return CompositeVideoClip(
+        all_clips, size=(screen_width, screen_height)
+    ).with_duration(video_duration)
+
+
+def clip_layer(clip, t):
+    """Возвращает кадр, маску и позицию клипа в момент t так же, как их берёт blit_on."""
+    ct = t - clip.start
+    frame = clip.get_frame(ct).astype("uint8")
+    mask = None
+    if clip.mask is not None:
+        mask = (clip.mask.get_frame(ct) * 255).astype("uint8")
+
+    height, width = frame.shape[:2]
+    x, y = clip.pos(ct)
+    if isinstance(x, str):
+        x = {
+            "left": 0,
+            "center": (screen_width - width) / 2,
+            "right": screen_width - width,
+        }[x]
+    if isinstance(y, str):
+        y = {
+            "top": 0,
+            "center": (screen_height - height) / 2,
+            "bottom": screen_height - height,
+        }[y]
+    return frame, mask, (int(x), int(y))
+
+
+def blend_layer(picture, layer):
+    """Накладывает слой на кадр на месте, пересчитывая только область слоя."""
+    frame, mask, (x, y) = layer
+    height, width = frame.shape[:2]
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + width, screen_width), min(y + height, screen_height)
+    if x0 >= x1 or y0 >= y1:
+        return
+
+    region = picture[y0:y1, x0:x1]
+    foreground = frame[y0 - y : y1 - y, x0 - x : x1 - x, :3]
+    if mask is None:
+        region[...] = foreground
+        return
+
+    # Та же целочисленная формула, что у PIL Image.paste с маской в blit_on;
+    # максимум промежуточного значения 65407, поэтому хватает uint16
+    alpha = mask[y0 - y : y1 - y, x0 - x : x1 - x, None].astype(np.uint16)
+    tmp = region * (255 - alpha) + foreground * alpha + 128
+    region[...] = ((tmp >> 8) + tmp) >> 8
+
+
+def render_variant_frame(base, layers, writer):
+    """Накладывает слои варианта на копию общего кадра и отдаёт кадр энкодеру."""
+    picture = base.copy()
+    for layer in layers:
+        blend_layer(picture, layer)
+    writer.write_frame(picture)
+
+
+def render_variants(variants):
+    """Рендерит все варианты за один проход по таймлайну, по энкодеру на вариант."""
+    # Аудио общее для всех вариантов, кодируем его один раз
+    audio_path = "./temp/audio/final_audio.m4a"
+    AudioFileClip("./temp/audio/final_audio.wav").write_audiofile(
+        audio_path, codec="aac", logger=None
+    )
+
+    slots = layer_slots(hook=True)
+    question_clips_by_style = {}
+    with ExitStack() as stack:
+        renders = []
+        for variant in variants:
+            number_image_dir = os.path.normpath(variant["number_image_dir"])
+            if number_image_dir not in question_clips_by_style:
+                # Папка карточек зависит от полного пути к стилю, а не только от его имени
+                style_hash = hashlib.sha1(number_image_dir.encode()).hexdigest()[:8]
+                question_image_dir = (
+                    "./temp/images/questions/"
+                    f"{os.path.basename(number_image_dir)}_{style_hash}"
+                )
+                process_data(
+                    {
+                        **IMAGE_CONFIG,
+                        "number_image_dir": number_image_dir,
+                        "question_image_dir": question_image_dir,
+                    },
+                    create_answers=False,
+                )
+                question_clips_by_style[number_image_dir] = make_question_clips(
+                    question_image_dir
+                )
+
+            writer = stack.enter_context(
+                FFMPEG_VideoWriter(
+                    f"./result/video_{variant['name']}.mp4",
+                    (screen_width, screen_height),
+                    fps,
+                    audiofile=audio_path,
+                    bitrate=variant.get("bitrate", "5000k"),
+                )
+            )
+            # Отдельный поток на вариант: наложение его слоёв и запись в энкодер.
+            # ExitStack закрывает поток раньше энкодера, дождавшись записи кадров.
+            executor = stack.enter_context(ThreadPoolExecutor(max_workers=1))
+            renders.append(
+                (
+                    question_clips_by_style[number_image_dir],
+                    variant.get("hook", True),
+                    writer,
+                    executor,
+                )
+            )
+
+        # Любой набор карточек подходит, чтобы узнать, виден ли вопрос: тайминги общие
+        any_question_clips = next(iter(question_clips_by_style.values()))
+        pending = []
+        for frame_index in range(int(video_duration * fps)):
+            t = frame_index / fps
+            playing = [
+                slot
+                for slot in slots[1:]
+                if (
+                    any_question_clips[slot] if isinstance(slot, int) else slot
+                ).is_playing(t)
+            ]
+            # Общие слои ниже первого видимого вопроса или хука смешиваются один раз;
+            # всё, что выше, накладывается по варианту, чтобы сохранить порядок слоёв
+            split = next(
+                (
+                    index
+                    for index, slot in enumerate(playing)
+                    if isinstance(slot, int) or slot is monkey_clip
+                ),
+                len(playing),
+            )
+            # Фон непрозрачен и покрывает весь кадр, поэтому служит основой как есть
+            base = background.get_frame(t).astype("uint8")
+            for slot in playing[:split]:
+                blend_layer(base, clip_layer(slot, t))
+
+            # Каждый клип декодируется не больше одного раза на кадр
+            decoded = {}
+            variant_layers = []
+            for question_clips, hook, _, _ in renders:
+                clips = [
+                    question_clips[slot] if isinstance(slot, int) else slot
+                    for slot in playing[split:]
+                    if hook or slot is not monkey_clip
+                ]
+                for clip in clips:
+                    if id(clip) not in decoded:
+                        decoded[id(clip)] = clip_layer(clip, t)
+                variant_layers.append([decoded[id(clip)] for clip in clips])
+
+            # Ждём предыдущий кадр, пока собирался текущий, чтобы не копить очередь
+            for future in pending:
+                future.result()
+            pending = [
+                executor.submit(render_variant_frame, base, layers, writer)
+                for (_, _, writer, executor), layers in zip(renders, variant_layers)
+            ]
+        for future in pending:
+            future.result()
+
+    for variant in variants:
+        print(
+            f"Вариант {variant['name']} сохранён: ./result/video_{variant['name']}.mp4"
+        )
+
 
+if variants:
+    render_variants(variants)
+else:
+    final_video = compose_video(make_question_clips("./temp/images/questions"))
 
-audio_clip = AudioFileClip("./temp/audio/final_audio.wav")
-final_video = final_video.with_audio(audio_clip)
-final_video.write_videofile("./result/video.mp4", fps=24, bitrate="5000k")
+    audio_clip = AudioFileClip("./temp/audio/final_audio.wav")
+    final_video = final_video.with_audio(audio_clip)
+    final_video.write_videofile("./result/video.mp4", fps=fps, bitrate="5000k")